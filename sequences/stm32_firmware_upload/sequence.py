@@ -9,7 +9,10 @@ Usage:
 """
 
 import asyncio
+import os
+import re
 import time
+from collections import deque
 from pathlib import Path
 from typing import Optional, Dict, Any
 
@@ -20,6 +23,9 @@ from station_service_sdk import (
     HardwareError,
 )
 
+# 플랫폼 분기 (CLI 실행 옵션, 설치 경로 검색)
+_IS_WINDOWS = os.name == "nt"
+
 
 class STM32FirmwareUpload(SequenceBase):
     """STM32 펌웨어 업로드 시퀀스"""
@@ -31,8 +37,54 @@ class STM32FirmwareUpload(SequenceBase):
     # STM32CubeProgrammer CLI 경로
     DEFAULT_PROGRAMMER_PATH = "/opt/st/stm32cubeclt_1.20.0/STM32CubeProgrammer/bin/STM32_Programmer_CLI"
 
+    # CLI 출력 파싱용 정규식: 디바이스 정보 + 단계별 완료 마커를 한 번의 스캔으로 추출
+    # (그룹 이름이 _parse_programmer_output 결과 키, 마커가 모두 ASCII라 디코딩 없이 bytes로 검사)
+    _OUTPUT_RE = re.compile(
+        rb"^[ \t]*(?:"
+        rb"ST-LINK SN[ \t]*:(?P<serial>[^\r\n]*)"
+        rb"|Device ID[ \t]*:(?P<device_id>[^\r\n]*)"
+        rb"|Device name[ \t]*:(?P<device_name>[^\r\n]*)"
+        rb"|(?P<erased>Mass erase successfully achieved)"
+        rb"|(?P<download_complete>File download complete)"
+        rb"|(?P<verified>Download verified successfully)"
+        rb"|(?P<reset>MCU Reset|[^\r\n]*reset is performed)"
+        rb")",
+        re.M,
+    )
+    _INFO_KEYS = frozenset({"serial", "device_id", "device_name"})
+
+    # ST-LINK 확인 결과 캐시 (프로세스 단위, 인스턴스 간 공유): serial -> (확인 시각, info)
+    _stlink_cache: Dict[str, tuple[float, dict]] = {}
+
+    # CLI 버전 확인 결과 디스크 캐시: 경로 -> {mtime_ns, size, version}
+    # (같은 바이너리면 setup마다 --version 실행 생략)
+    # None이면 사용 시점에 ~/.cache 아래 기본 경로 사용 (홈 디렉터리가 없는 계정에서도 import 가능)
+    _VERSION_CACHE_PATH: Optional[Path] = None
+
+    # setup에서 미리 시작한 ST-LINK 연결 확인 (단계별 실행 시 check_connection 스텝에서 사용)
+    _first_probe_task: Optional[asyncio.Task] = None
+
+    # 마지막으로 emit한 에러 코드 (teardown 진단 여부 판단용)
+    _last_error_code: Optional[str] = None
+
+    # 지원 펌웨어 확장자
+    _VALID_EXTS = frozenset({".bin", ".hex", ".elf"})
+
+    # .hex → .bin 변환 시 허용하는 최대 이미지 크기 (주소 공백이 큰 HEX는 변환하지 않음)
+    _MAX_BIN_SPAN = 16 * 1024 * 1024
+
+    # .hex → .bin 변환 시 0xFF로 채울 수 있는 최대 세그먼트 간 공백 (STM32 플래시 1페이지, F0/F1/G0/G4/L4: 1~2 KiB)
+    # (더 큰 공백을 채우면 HEX가 건드리지 않는 캘리브레이션/EEPROM 에뮬레이션/다른 뱅크 섹터까지 지워짐)
+    _MAX_BIN_GAP = 2048
+
+    # CLI 출력은 스트림별로 마지막 1 MiB만 보관 (마커 검사와 로그에는 끝부분이면 충분)
+    _OUTPUT_CHUNK_SIZE = 65536
+    _OUTPUT_TAIL_BYTES = 1 << 20
+
     async def setup(self) -> None:
         """하드웨어 초기화 및 검증"""
+        import stat
+
         self.emit_log("info", "Initializing STM32 firmware upload sequence...")
 
         # 파라미터 로드
@@ -47,129 +99,138 @@ class STM32FirmwareUpload(SequenceBase):
         self.connection_mode = self.get_parameter("connection_mode", "swd")
         self.start_address = self.get_parameter("start_address", "0x08000000")
         self.stop_on_failure = self.get_parameter("stop_on_failure", True)
+        self.convert_to_bin = self.get_parameter("convert_to_bin", False)
+        self.skip_if_identical = self.get_parameter("skip_if_identical", False)
+        self.fast_subprocess = self.get_parameter("fast_subprocess", False)
+        self.legacy_mode = self.get_parameter("legacy_mode", False)
+        self.diagnose_on_failure = self.get_parameter("diagnose_on_failure", False)
+        self.cli_idle_timeout = self.get_parameter("cli_idle_timeout", 60.0)  # 초
+        self.stlink_cache_ttl = self.get_parameter("stlink_cache_ttl", 0.0)  # 초, 0: 캐시 안 함
+
+        # SDK에 로그 레벨 필터가 없으므로 debug 파라미터로 디버그 로그 생성 여부 결정
+        self._debug_enabled = bool(self.get_parameter("debug", True))
 
         # ST-LINK 연결 옵션 (양산용)
         self.connect_mode = self.get_parameter("connect_mode", "HOTPLUG")  # HOTPLUG(양산), NORMAL, UR
         self.reset_mode = self.get_parameter("reset_mode", "HWrst")  # HWrst, SWrst, Crst
         self.frequency = self.get_parameter("frequency", 4000)  # kHz
 
+        # 연결 인자는 setup 이후 변하지 않으므로 한 번만 생성
+        # (예: "port=SWD mode=HOTPLUG" -> ["port=SWD", "mode=HOTPLUG"])
+        self._connect_args = self._build_connect_args().split()
+
+        # 인자가 고정된 CLI 명령은 argv를 미리 생성
+        self._probe_argv = ["-c"] + self._connect_args + ["-l"]
+        self._erase_argv = ["-c"] + self._connect_args + ["-e", "all"]
+        self._reset_argv = ["-c"] + self._connect_args + ["-rst"]
+
+        # CLI 실행 파일은 심볼릭 링크를 해석한 절대 경로로 실행
+        # (디렉터리가 포함된 경로 + close_fds=False이면 Linux에서 fork/exec 대신 posix_spawn 사용,
+        #  실행마다 PATH 검색/링크 해석 생략)
+        self._programmer_exe = str(Path(self.programmer_path).resolve())
+
+        # stop_on_failure이면 upload_firmware 스텝에서 write/verify/reset을 CLI 한 번으로 처리
+        # (CLI가 첫 실패에서 중단하므로 동작 동일, 리셋용 ST-LINK 재연결 비용 절감)
+        # 연결 확인/지우기는 스텝별 소요 시간과 스텝 사이 중단(abort)을 위해 따로 실행
+        # 실패 후에도 계속 진행해야 하거나 legacy_mode이면 리셋도 개별 호출 사용
+        self._fused = self.stop_on_failure and not self.legacy_mode
+
+        # run() 스텝 목록: (이름, 설명, 에러 코드, 핸들러)
+        self._steps = [("check_connection", "ST-LINK 연결 확인", "CONNECTION_ERROR", self._step_check_connection)]
+        if self.erase_before_upload:
+            self._steps.append(("erase_chip", "플래시 메모리 지우기", "ERASE_ERROR", self._step_erase))
+        self._steps.append(("upload_firmware", "펌웨어 업로드", "UPLOAD_ERROR", self._step_upload))
+        if self.verify_after_upload:
+            # 검증은 업로드 시 함께 수행 (-v 옵션), 여기서는 결과만 보고
+            self._steps.append(("verify_firmware", "펌웨어 검증", "VERIFY_ERROR", self._step_verify))
+
         # 펌웨어 파일 검증
         if not self.firmware_path:
             raise SetupError("firmware_path parameter is required")
 
-        firmware_file = Path(self.firmware_path)
-        if not firmware_file.exists():
+        # stat 1회로 존재/파일 여부/크기 확인
+        try:
+            st = os.stat(self.firmware_path)
+        except FileNotFoundError:
             raise SetupError(f"Firmware file not found: {self.firmware_path}")
+        except OSError as e:
+            # 상위 경로가 파일(NotADirectoryError), 디렉터리 권한 없음(PermissionError) 등
+            raise SetupError(f"Firmware file not accessible: {self.firmware_path} ({e.strerror})")
 
-        if not firmware_file.suffix.lower() in ['.bin', '.hex', '.elf']:
-            raise SetupError(f"Unsupported firmware format: {firmware_file.suffix}")
+        if not stat.S_ISREG(st.st_mode):
+            raise SetupError(f"Firmware path is not a file: {self.firmware_path}")
 
-        self.firmware_size = firmware_file.stat().st_size
+        suffix = os.path.splitext(self.firmware_path)[1]
+        if suffix.lower() not in self._VALID_EXTS:
+            raise SetupError(f"Unsupported firmware format: {suffix}")
+
+        self.firmware_size = st.st_size
         self.emit_log("info", f"Firmware file: {self.firmware_path} ({self.firmware_size} bytes)")
 
         # STM32CubeProgrammer CLI 검증
         await self._validate_programmer()
 
+        # 연결 확인 CLI를 미리 시작해 남은 setup과 병행
+        # (skip_if_identical은 읽기 호출로 연결 확인)
+        if not self.skip_if_identical:
+            self._first_probe_task = asyncio.create_task(self._check_stlink_connection())
+
+        # .hex → .bin 변환 캐시 (옵션)
+        # 파일 I/O와 HEX 파싱이 이벤트 루프를 막지 않도록 스레드에서 실행 (연결 확인 CLI와 병행)
+        if self.convert_to_bin:
+            await asyncio.to_thread(self._prepare_firmware)
+
+        # 타겟 비교는 플래시 이미지와 바로 비교 가능한 .bin만 지원
+        if self.skip_if_identical and os.path.splitext(self.firmware_path)[1].lower() != ".bin":
+            self.emit_log("warning", "skip_if_identical requires a .bin firmware (or convert_to_bin), disabled")
+            self.skip_if_identical = False
+
         self.emit_log("info", "Setup completed successfully")
 
     async def run(self) -> RunResult:
         """펌웨어 업로드 실행"""
-        # 스텝 수 계산: 연결확인 + (지우기?) + 업로드 + (검증?)
-        total_steps = 2  # 연결확인 + 업로드
-        if self.erase_before_upload:
-            total_steps += 1
-        if self.verify_after_upload:
-            total_steps += 1
+        total_steps = len(self._steps)
 
         passed = True
-        measurements: Dict[str, Any] = {}
         stopped_at: Optional[str] = None
-        current_step = 0
 
-        # Step: ST-LINK 연결 확인
-        current_step += 1
-        self.check_abort()
-        self.emit_step_start("check_connection", current_step, total_steps, "ST-LINK 연결 확인")
-        step_start = time.time()
+        # 측정값은 스텝마다 emit하지 않고 모아서 RunResult로 한 번에 전달
+        self._pending_measurements: Dict[str, Any] = {}
+        self._run_data: Dict[str, Any] = {}
 
-        try:
-            connected, stlink_info = await self._check_stlink_connection()
-            if not connected:
-                raise HardwareError("ST-LINK not detected")
+        # 스텝 간 공유 상태 (업로드/검증/리셋 단일 호출 결과, 업로드 시 수행된 검증 결과)
+        self._program_result: Optional[Dict[str, Any]] = None
+        self._verify_result = False
+        # 타겟 플래시가 펌웨어와 동일하면 지우기/업로드/검증 생략 (skip_if_identical)
+        self._firmware_identical = False
 
-            self.emit_log("info", f"ST-LINK detected: {stlink_info}")
-            self.emit_step_complete("check_connection", current_step, True, time.time() - step_start)
-        except Exception as e:
-            self.emit_error("CONNECTION_ERROR", str(e))
-            self.emit_step_complete("check_connection", current_step, False, time.time() - step_start, error=str(e))
-            if self.stop_on_failure:
-                return {"passed": False, "measurements": measurements, "data": {"stopped_at": "check_connection"}}
-            passed = False
-            stopped_at = "check_connection"
-
-        # Step: 칩 지우기 (Erase) - 옵션
-        if self.erase_before_upload and (passed or not self.stop_on_failure):
-            current_step += 1
+        for index, (step_name, description, error_code, handler) in enumerate(self._steps, 1):
             self.check_abort()
-            self.emit_step_start("erase_chip", current_step, total_steps, "플래시 메모리 지우기")
-            step_start = time.time()
+            self.emit_step_start(step_name, index, total_steps, description)
+            step_start = time.perf_counter()
 
             try:
-                erase_success = await self._erase_flash()
-                if not erase_success:
-                    raise HardwareError("Failed to erase flash memory")
-
-                self.emit_step_complete("erase_chip", current_step, True, time.time() - step_start)
+                await handler()
             except Exception as e:
-                self.emit_error("ERASE_ERROR", str(e))
-                self.emit_step_complete("erase_chip", current_step, False, time.time() - step_start, error=str(e))
+                # 소요 시간은 에러 emit 전에 한 번만 측정
+                elapsed = time.perf_counter() - step_start
+                self.emit_error(error_code, str(e))
+                self.emit_step_complete(step_name, index, False, elapsed, error=str(e))
                 if self.stop_on_failure:
-                    return {"passed": False, "measurements": measurements, "data": {"stopped_at": "erase_chip"}}
+                    return self._fail(step_name)
                 passed = False
-                stopped_at = stopped_at or "erase_chip"
-
-        # Step: 펌웨어 업로드 (검증 옵션 포함)
-        verify_result = False
-        if passed or not self.stop_on_failure:
-            current_step += 1
-            self.check_abort()
-            self.emit_step_start("upload_firmware", current_step, total_steps, "펌웨어 업로드")
-            step_start = time.time()
-
-            try:
-                # 업로드 시 검증도 함께 수행 (-v 옵션)
-                upload_success, upload_time, verify_result = await self._upload_firmware(
-                    verify=self.verify_after_upload
-                )
-                if not upload_success:
-                    raise HardwareError("Failed to upload firmware")
-
-                self.emit_step_complete("upload_firmware", current_step, True, time.time() - step_start)
-            except Exception as e:
-                self.emit_error("UPLOAD_ERROR", str(e))
-                self.emit_step_complete("upload_firmware", current_step, False, time.time() - step_start, error=str(e))
-                if self.stop_on_failure:
-                    return {"passed": False, "measurements": measurements, "data": {"stopped_at": "upload_firmware"}}
-                passed = False
-                stopped_at = stopped_at or "upload_firmware"
-
-        # Step: 검증 결과 보고 (업로드 시 이미 수행됨)
-        if self.verify_after_upload and (passed or not self.stop_on_failure):
-            current_step += 1
-            self.check_abort()
-            self.emit_step_start("verify_firmware", current_step, total_steps, "펌웨어 검증")
-            step_start = time.time()
-
-            if verify_result:
-                self.emit_step_complete("verify_firmware", current_step, True, time.time() - step_start)
+                stopped_at = stopped_at or step_name
             else:
-                self.emit_error("VERIFY_ERROR", "Firmware verification failed")
-                self.emit_step_complete("verify_firmware", current_step, False, time.time() - step_start, error="Firmware verification failed")
-                passed = False
-                stopped_at = stopped_at or "verify_firmware"
+                self.emit_step_complete(step_name, index, True, time.perf_counter() - step_start)
 
         # 리셋 (선택적)
-        if self.reset_after_upload and passed:
+        if self.reset_after_upload and passed and self._program_result is not None:
+            # 단일 호출에 -rst 포함됨
+            if self._program_result["reset"]:
+                self.emit_log("info", "Target reset completed")
+            else:
+                self.emit_log("warning", "Reset failed: no reset confirmation in CLI output")
+        elif self.reset_after_upload and passed:
             self.check_abort()
             try:
                 await self._reset_target()
@@ -179,10 +240,12 @@ class STM32FirmwareUpload(SequenceBase):
 
         result: RunResult = {
             "passed": passed,
-            "measurements": measurements,
+            "measurements": self._pending_measurements,
         }
         if stopped_at:
-            result["data"] = {"stopped_at": stopped_at}
+            self._run_data["stopped_at"] = stopped_at
+        if self._run_data:
+            result["data"] = self._run_data
 
         return result
 
@@ -190,37 +253,128 @@ class STM32FirmwareUpload(SequenceBase):
         """정리 작업"""
         self.emit_log("info", "Cleaning up...")
 
+        # setup 이후 사용되지 않은 연결 확인 작업 정리
+        if self._first_probe_task is not None:
+            self._first_probe_task.cancel()
+            await asyncio.gather(self._first_probe_task, return_exceptions=True)
+            self._first_probe_task = None
+
         # 이전 단계 에러 확인 및 진단 정보 수집
         if self.last_error:
             self.emit_log("warning", f"이전 단계에서 에러 발생: {self.last_error}")
 
-            # 실패 시 ST-LINK 상태 재확인
+        # 연결 실패 시에만 ST-LINK 상태 재확인 (CLI 재실행 비용이 커서 옵션으로만 수행)
+        # (지우기/업로드/검증 실패는 이미 연결된 상태였으므로 재확인 불필요)
+        if self._last_error_code == "CONNECTION_ERROR" and self.diagnose_on_failure:
             try:
                 connected, info = await self._check_stlink_connection()
                 if connected:
-                    self.emit_log("debug", f"ST-LINK 상태: 연결됨 - {info.get('serial', 'unknown')}")
+                    self.emit_log("info", f"ST-LINK 상태: 연결됨 - {info.get('serial', 'unknown')}")
                 else:
-                    self.emit_log("debug", "ST-LINK 상태: 연결 끊김")
+                    self.emit_log("warning", "ST-LINK 상태: 연결 끊김")
             except Exception as e:
-                self.emit_log("debug", f"ST-LINK 상태 확인 실패: {e}")
+                self.emit_log("warning", f"ST-LINK 상태 확인 실패: {e}")
 
         # ST-LINK 연결 해제는 CLI가 자동으로 처리
         self.emit_log("info", "Teardown completed")
 
+    def emit_error(self, code: str, message: str, recoverable: bool = False) -> None:
+        """에러 emit (teardown 진단용으로 에러 코드 기록)"""
+        self._last_error_code = code
+        super().emit_error(code, message, recoverable)
+
+    # =========================================================================
+    # Step Handlers
+    # =========================================================================
+
+    async def _step_check_connection(self) -> None:
+        """Step: ST-LINK 연결 확인"""
+        # 연결 확인(CLI 대기) 동안 펌웨어 해시 계산을 병행
+        hash_task = asyncio.create_task(asyncio.to_thread(self._hash_firmware))
+        try:
+            if self.skip_if_identical:
+                # 플래시 읽기 호출로 연결 확인과 동일 여부 비교를 함께 수행
+                connected, stlink_info, self._firmware_identical = await self._compare_target_firmware()
+                self._verify_result = self._firmware_identical
+                self._run_data["firmware_identical"] = self._firmware_identical
+            else:
+                # setup에서 시작한 연결 확인이 있으면 그 결과 사용 (첫 실행 한 번만)
+                probe_task, self._first_probe_task = self._first_probe_task, None
+                connected, stlink_info = await (probe_task or self._check_stlink_connection())
+        finally:
+            try:
+                self._run_data["firmware_sha256"] = await hash_task
+            except OSError as e:
+                self.emit_log("warning", f"Firmware hash failed: {e}")
+
+        if not connected:
+            raise HardwareError("ST-LINK not detected")
+
+        self.emit_log("info", f"ST-LINK detected: {stlink_info}")
+
+    async def _step_erase(self) -> None:
+        """Step: 칩 지우기 (Erase)"""
+        if self._firmware_identical:
+            self.emit_log("info", "Erase skipped: target already has this firmware")
+            return
+        if not await self._erase_flash():
+            raise HardwareError("Failed to erase flash memory")
+
+    async def _step_upload(self) -> None:
+        """Step: 펌웨어 업로드 (검증 옵션 포함)"""
+        if self._firmware_identical:
+            self.emit_log("info", "Upload skipped: target already has this firmware")
+            self._pending_measurements["firmware_size"] = self.firmware_size
+            return
+        if self._fused:
+            # write/verify/reset 단일 호출 (리셋은 수 ms라 upload_time 의미는 단계별 실행과 동일)
+            self._program_result = await self._run_full_sequence()
+            upload_success = self._program_result["downloaded"]
+            upload_time = self._program_result["duration"]
+            self._verify_result = self._program_result["verified"]
+        else:
+            # 업로드 시 검증도 함께 수행 (-v 옵션)
+            upload_success, upload_time, self._verify_result = await self._upload_firmware(
+                verify=self.verify_after_upload
+            )
+        if not upload_success:
+            raise HardwareError("Failed to upload firmware")
+
+        self._pending_measurements["firmware_size"] = self.firmware_size
+        self._pending_measurements["upload_time"] = round(upload_time, 3)
+
+    async def _step_verify(self) -> None:
+        """Step: 검증 결과 보고 (업로드 시 이미 수행됨)"""
+        if not self._verify_result:
+            raise HardwareError("Firmware verification failed")
+
+    def _fail(self, step: str) -> RunResult:
+        """스텝 실패로 중단된 RunResult"""
+        return {
+            "passed": False,
+            "measurements": self._pending_measurements,
+            "data": {**self._run_data, "stopped_at": step},
+        }
+
     # =========================================================================
     # Private Methods
     # =========================================================================
 
     # 일반적인 STM32CubeProgrammer 설치 경로들
-    COMMON_PROGRAMMER_PATHS = [
+    _LINUX_PATHS = (
         "/opt/st/stm32cubeclt_1.20.0/STM32CubeProgrammer/bin/STM32_Programmer_CLI",
         "/opt/st/stm32cubeide_1.17.0/plugins/com.st.stm32cube.ide.mcu.externaltools.cubeprogrammer.linux64_2.2.100.202406141446/tools/bin/STM32_Programmer_CLI",
         "/usr/local/STMicroelectronics/STM32Cube/STM32CubeProgrammer/bin/STM32_Programmer_CLI",
         "/opt/STM32CubeProgrammer/bin/STM32_Programmer_CLI",
-        # Windows paths
+    )
+    _WINDOWS_PATHS = (
         "C:/Program Files/STMicroelectronics/STM32Cube/STM32CubeProgrammer/bin/STM32_Programmer_CLI.exe",
         "C:/ST/STM32CubeCLT/STM32CubeProgrammer/bin/STM32_Programmer_CLI.exe",
-    ]
+    )
+    COMMON_PROGRAMMER_PATHS = list(_LINUX_PATHS + _WINDOWS_PATHS)
+
+    # 검색으로 찾은 CLI 경로 (프로세스 단위, 인스턴스 간 공유)
+    _resolved_programmer: Optional[str] = None
 
     async def _validate_programmer(self) -> None:
         """STM32CubeProgrammer CLI 설치 검증"""
@@ -229,11 +383,7 @@ class STM32FirmwareUpload(SequenceBase):
         # 1. 지정된 경로 확인
         if not programmer_path.exists():
             # 대안 경로 검색
-            found_path = None
-            for alt_path in self.COMMON_PROGRAMMER_PATHS:
-                if Path(alt_path).exists():
-                    found_path = alt_path
-                    break
+            found_path = self._find_programmer()
 
             error_msg = f"STM32CubeProgrammer CLI not found: {self.programmer_path}"
 
@@ -250,64 +400,63 @@ class STM32FirmwareUpload(SequenceBase):
             raise SetupError(error_msg)
 
         # 2. 실행 권한 확인 (Linux/macOS)
-        import os
-        if os.name != 'nt' and not os.access(programmer_path, os.X_OK):
+        if not _IS_WINDOWS and not os.access(programmer_path, os.X_OK):
             raise SetupError(
                 f"STM32CubeProgrammer CLI is not executable: {self.programmer_path}\n"
                 f"  Run: chmod +x {self.programmer_path}"
             )
 
-        # 3. 실제 실행 가능 여부 확인 (버전 출력 테스트)
+        # 3. 이전에 확인한 바이너리와 같으면 버전 확인 생략
+        cached_version = self._get_cached_version(programmer_path)
+        if cached_version is not None:
+            self.emit_log("info", f"Programmer (cached): {cached_version}")
+            return
+
+        # 4. 실제 실행 가능 여부 확인 (버전 출력 테스트)
         import subprocess
         import traceback
 
-        self.emit_log("debug", f"Validating programmer at: {programmer_path}")
+        if self._debug_enabled:
+            self.emit_log("debug", f"Validating programmer at: {programmer_path}")
 
         try:
             # PyInstaller 환경에서 안정적인 실행을 위해 shell=False 사용
             # Windows에서 콘솔 창이 뜨지 않도록 CREATE_NO_WINDOW 플래그 사용
-            import os
             cmd_list = [str(programmer_path), "--version"]
-            self.emit_log("debug", f"Running: {cmd_list}")
+            if self._debug_enabled:
+                self.emit_log("debug", f"Running: {cmd_list}")
 
-            if os.name == 'nt':
+            popen_kwargs: Dict[str, Any] = {}
+            if _IS_WINDOWS:
                 # Windows: shell=False + CREATE_NO_WINDOW (PyInstaller 호환)
-                # encoding='utf-8' + errors='replace'로 cp949 디코딩 에러 방지
-                CREATE_NO_WINDOW = 0x08000000
-                result = subprocess.run(
-                    cmd_list,
-                    capture_output=True,
-                    text=True,
-                    timeout=10,
-                    shell=False,
-                    creationflags=CREATE_NO_WINDOW,
-                    encoding='utf-8',
-                    errors='replace',
-                )
-            else:
-                result = subprocess.run(
-                    cmd_list,
-                    capture_output=True,
-                    text=True,
-                    timeout=10,
-                )
-            # stdout/stderr가 None일 수 있으므로 안전하게 처리
-            stdout = result.stdout or ""
-            stderr = result.stderr or ""
-            output = stdout + stderr
-            self.emit_log("debug", f"Programmer output: {output[:200]}...")
+                popen_kwargs["creationflags"] = 0x08000000  # CREATE_NO_WINDOW
+
+            # 이벤트 루프를 막지 않도록 executor 스레드에서 실행
+            returncode, stdout, stderr = await asyncio.get_running_loop().run_in_executor(
+                None, self._run_subprocess_blocking, cmd_list, 10, subprocess.PIPE, popen_kwargs
+            )
+            # errors='replace'로 cp949 디코딩 에러 방지
+            output = stdout.decode("utf-8", errors="replace") + stderr.decode("utf-8", errors="replace")
+            if self._debug_enabled:
+                self.emit_log("debug", f"Programmer output: {output[:200]}...")
 
-            if "STM32CubeProgrammer" in output or result.returncode == 0:
+            if "STM32CubeProgrammer" in output or returncode == 0:
                 # 버전 정보 추출 시도
-                for line in output.split("\n"):
-                    if "version" in line.lower() or "STM32CubeProgrammer" in line:
-                        self.emit_log("info", f"Programmer: {line.strip()}")
-                        break
+                banner = next(
+                    (line for line in output.splitlines()
+                     if "version" in line.lower() or "STM32CubeProgrammer" in line),
+                    None,
+                )
+                if banner is not None:
+                    version = banner.strip()
+                    self.emit_log("info", f"Programmer: {version}")
                 else:
+                    version = "STM32CubeProgrammer CLI"
                     self.emit_log("info", f"STM32CubeProgrammer CLI verified: {self.programmer_path}")
+                self._store_cached_version(programmer_path, version)
             else:
                 raise SetupError(
-                    f"STM32CubeProgrammer CLI failed to execute (rc={result.returncode}):\n{output}"
+                    f"STM32CubeProgrammer CLI failed to execute (rc={returncode}):\n{output}"
                 )
         except subprocess.TimeoutExpired:
             raise SetupError("STM32CubeProgrammer CLI timed out during version check")
@@ -331,6 +480,228 @@ class STM32FirmwareUpload(SequenceBase):
             tb = traceback.format_exc()
             raise SetupError(f"Failed to verify STM32CubeProgrammer CLI: {type(e).__name__}: {e}\n{tb}")
 
+    @classmethod
+    def _find_programmer(cls) -> Optional[str]:
+        """PATH → 일반 설치 경로 순으로 CLI 검색 (찾은 경로는 이후 setup에서 재사용)"""
+        import shutil
+
+        if cls._resolved_programmer and os.path.isfile(cls._resolved_programmer):
+            return cls._resolved_programmer
+
+        # 설치 프로그램이 등록한 PATH 우선, 없으면 현재 OS 경로만 확인 (첫 번째 파일에서 중단)
+        candidates = cls._WINDOWS_PATHS if _IS_WINDOWS else cls._LINUX_PATHS
+        found_path = shutil.which("STM32_Programmer_CLI") or next(
+            (p for p in candidates if os.path.isfile(p)), None
+        )
+        if found_path:
+            cls._resolved_programmer = found_path
+        return found_path
+
+    @classmethod
+    def _version_cache_path(cls) -> Path:
+        """버전 캐시 파일 경로 (홈 디렉터리를 확인할 수 없으면 RuntimeError)"""
+        if cls._VERSION_CACHE_PATH is not None:
+            return cls._VERSION_CACHE_PATH
+        return Path.home() / ".cache" / "stm32_firmware_upload" / "programmer_cache.json"
+
+    def _get_cached_version(self, programmer_path: Path) -> Optional[str]:
+        """디스크 캐시에서 CLI 버전 조회 (경로/mtime/크기가 같을 때만 유효)"""
+        import json
+
+        try:
+            st = os.stat(programmer_path)
+            with open(self._version_cache_path(), encoding="utf-8") as f:
+                entry = json.load(f).get(os.path.abspath(programmer_path))
+        except (OSError, ValueError, AttributeError, RuntimeError):
+            # 캐시 파일 없음/손상, 홈 디렉터리 확인 불가 → 캐시 미스
+            return None
+
+        if (
+            isinstance(entry, dict)
+            and entry.get("mtime_ns") == st.st_mtime_ns
+            and entry.get("size") == st.st_size
+        ):
+            return entry.get("version")
+        return None
+
+    def _store_cached_version(self, programmer_path: Path, version: str) -> None:
+        """CLI 버전을 디스크 캐시에 저장 (실패해도 무시)"""
+        import json
+
+        try:
+            cache_path = self._version_cache_path()
+            st = os.stat(programmer_path)
+            try:
+                with open(cache_path, encoding="utf-8") as f:
+                    cache = json.load(f)
+                if not isinstance(cache, dict):
+                    cache = {}
+            except (OSError, ValueError):
+                cache = {}
+
+            cache[os.path.abspath(programmer_path)] = {
+                "mtime_ns": st.st_mtime_ns,
+                "size": st.st_size,
+                "version": version,
+            }
+
+            # 동시에 실행되는 다른 스테이션 프로세스와 충돌하지 않도록 원자적으로 교체
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, cache_path)
+        except (OSError, RuntimeError) as e:
+            self.emit_log("warning", f"Failed to write programmer cache: {e}")
+
+    def _prepare_firmware(self) -> None:
+        """.hex 펌웨어를 .bin으로 변환하여 캐시
+
+        CLI가 업로드마다 HEX 레코드를 파싱하지 않도록 원본 옆에
+        <firmware>.<address>.bin 으로 한 번 변환해 두고, 변환 당시 원본의
+        크기/mtime(<cache>.src에 기록)과 정확히 같으면 재사용한다
+        (cp -p 등으로 더 오래된 mtime의 파일로 바뀌어도 재변환).
+        이미지 시작 주소가 start_address와 다르거나
+        세그먼트 사이 공백이 플래시 1페이지보다 크거나 전체 크기가 너무 크면
+        원본 그대로 업로드한다.
+        (.elf는 변환하지 않음)
+        """
+
+        if os.path.splitext(self.firmware_path)[1].lower() != ".hex":
+            return
+
+        try:
+            start = int(self.start_address, 0)
+        except ValueError:
+            self.emit_log("warning", f"Invalid start_address, skip .bin conversion: {self.start_address}")
+            return
+
+        cache_path = f"{self.firmware_path}.{start:08x}.bin"
+        key_path = cache_path + ".src"
+        st = os.stat(self.firmware_path)
+        source_key = f"{st.st_size}:{st.st_mtime_ns}"
+        try:
+            with open(key_path, encoding="ascii") as f:
+                cache_fresh = f.read() == source_key and os.path.isfile(cache_path)
+        except (OSError, ValueError):
+            cache_fresh = False
+
+        if not cache_fresh:
+            base, image = self._hex_to_bin(self.firmware_path)
+            if image is None:
+                self.emit_log("info", "Skip .bin conversion (HEX has gaps larger than a flash page or is too large)")
+                return
+            if base != start:
+                self.emit_log(
+                    "info",
+                    f"Skip .bin conversion (image base=0x{base:08X}, start_address={self.start_address})",
+                )
+                return
+
+            try:
+                self._write_atomic(cache_path, image)
+                # .bin 교체 후 원본 키 기록 (중간에 중단되면 다음 setup에서 재변환)
+                self._write_atomic(key_path, source_key.encode("ascii"))
+            except OSError as e:
+                # 읽기 전용/용량 부족 디렉터리 등: 캐시 없이 원본 그대로 업로드
+                self.emit_log("warning", f"Cannot write .bin cache, uploading original HEX: {e}")
+                return
+            self.emit_log("info", f"Converted firmware to binary: {cache_path}")
+        else:
+            self.emit_log("info", f"Using cached binary firmware: {cache_path}")
+
+        self.firmware_path = cache_path
+        self.firmware_size = os.stat(cache_path).st_size
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        """같은 디렉터리의 프로세스별 임시 파일에 쓴 뒤 원자적으로 교체
+
+        펌웨어 디렉터리를 공유하는 여러 스테이션이 같은 임시 파일 이름으로 충돌하지 않도록
+        mkstemp로 고유 이름을 사용한다. 실패하면 임시 파일을 지우고 OSError를 그대로 전달.
+        """
+        import tempfile
+
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            # mkstemp는 0600으로 생성하므로 다른 계정의 스테이션/CLI도 읽을 수 있게 조정
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @staticmethod
+    def _hex_to_bin(path: str) -> tuple[int, Optional[bytes]]:
+        """Intel HEX 파일을 (시작 주소, 바이너리 이미지)로 변환 (공백은 0xFF로 채움)
+
+        세그먼트 사이 공백이 _MAX_BIN_GAP보다 크거나 이미지가 _MAX_BIN_SPAN보다 크면
+        이미지 대신 None 반환 (공백을 채운 .bin은 HEX가 건드리지 않는 섹터까지 지움)
+        """
+        segments = []
+        upper = 0
+
+        with open(path, "r", encoding="ascii", errors="replace") as f:
+            for lineno, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    if line[0] != ":":
+                        raise ValueError("missing ':'")
+                    record = bytes.fromhex(line[1:])
+                    if len(record) < 5 or len(record) != record[0] + 5 or sum(record) & 0xFF:
+                        raise ValueError("bad length or checksum")
+                except ValueError as e:
+                    raise SetupError(f"Invalid HEX record at {path}:{lineno}: {e}")
+
+                rtype = record[3]
+                data = record[4:-1]
+                if rtype == 0x00:  # Data
+                    segments.append((upper + int.from_bytes(record[1:3], "big"), data))
+                elif rtype == 0x01:  # End Of File
+                    break
+                elif rtype == 0x02:  # Extended Segment Address
+                    upper = int.from_bytes(data, "big") << 4
+                elif rtype == 0x04:  # Extended Linear Address
+                    upper = int.from_bytes(data, "big") << 16
+                # 0x03/0x05 (시작 실행 주소)는 플래시 내용과 무관
+
+        if not segments:
+            raise SetupError(f"HEX file contains no data: {path}")
+
+        segments.sort(key=lambda segment: segment[0])
+        base = segments[0][0]
+        end = base
+        for addr, data in segments:
+            if addr - end > STM32FirmwareUpload._MAX_BIN_GAP:
+                return base, None
+            end = max(end, addr + len(data))
+        if end - base > STM32FirmwareUpload._MAX_BIN_SPAN:
+            return base, None
+
+        image = bytearray(b"\xff") * (end - base)
+        for addr, data in segments:
+            image[addr - base:addr - base + len(data)] = data
+        return base, bytes(image)
+
+    def _hash_firmware(self) -> str:
+        """업로드할 펌웨어 파일의 SHA-256 (스레드에서 실행)"""
+        import hashlib
+
+        digest = hashlib.sha256()
+        with open(self.firmware_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
     def _build_connect_args(self) -> str:
         """ST-LINK 연결 인자 문자열 생성"""
         # 기본: port=SWD
@@ -350,57 +721,114 @@ class STM32FirmwareUpload(SequenceBase):
 
         return connect_str
 
-    async def _run_programmer_cmd(self, args: list) -> tuple[bool, str]:
-        """STM32CubeProgrammer CLI 명령 실행"""
+    async def _run_programmer_cmd(self, args: list) -> tuple[bool, bytes, bytes]:
+        """STM32CubeProgrammer CLI 명령 실행
+
+        Args:
+            args: CLI 인자 목록
+
+        Returns:
+            (success, stdout, stderr) - 디코딩하지 않은 bytes
+        """
         import subprocess
-        import os
         import traceback
 
-        cmd_list = [self.programmer_path] + args
-        self.emit_log("debug", f"Running: {' '.join(cmd_list)}")
+        cmd_list = [self._programmer_exe] + args
+        if self._debug_enabled:
+            self.emit_log("debug", f"Running: {' '.join(cmd_list)}")
+
+        # 출력은 항상 수집 (erase/reset 실패 시에도 CLI 에러 메시지를 로그로 남기기 위해,
+        # 크기는 _drain이 스트림별 마지막 _OUTPUT_TAIL_BYTES로 제한)
+        stream = subprocess.PIPE
+
+        popen_kwargs: Dict[str, Any] = {}
+        if _IS_WINDOWS:
+            # Windows: shell=False + CREATE_NO_WINDOW (PyInstaller 호환)
+            popen_kwargs["creationflags"] = 0x08000000  # CREATE_NO_WINDOW
+        else:
+            # Python fd는 기본적으로 상속되지 않으므로(PEP 446) close_fds 불필요
+            # (ulimit이 큰 호스트에서 fd 전체를 닫는 비용 제거)
+            popen_kwargs["close_fds"] = False
 
         try:
-            # Note: subprocess.run 사용 (asyncio.create_subprocess_exec는 Windows embedded Python에서 문제 발생)
-            # run_in_executor로 블로킹 방지
+            # Note: subprocess.Popen 사용 (asyncio.create_subprocess_exec는 Windows embedded Python에서 문제 발생)
+            # 파이프 읽기/대기는 run_in_executor로 블로킹 방지
             loop = asyncio.get_running_loop()
 
-            def run_cmd():
-                if os.name == 'nt':
-                    # Windows: shell=False + CREATE_NO_WINDOW (PyInstaller 호환)
-                    # encoding='utf-8' + errors='replace'로 cp949 디코딩 에러 방지
-                    CREATE_NO_WINDOW = 0x08000000
-                    return subprocess.run(
-                        cmd_list,
-                        capture_output=True,
-                        text=True,
-                        timeout=120,
-                        shell=False,
-                        creationflags=CREATE_NO_WINDOW,
-                        encoding='utf-8',
-                        errors='replace',
-                    )
+            process = subprocess.Popen(
+                cmd_list,
+                stdout=stream,
+                stderr=stream,
+                shell=False,
+                **popen_kwargs,
+            )
+
+            try:
+                if self.fast_subprocess:
+                    # 빠른 경로: executor에서 communicate 1회 (drain 스레드/이벤트 루프 왕복 생략)
+                    stdout, stderr = await loop.run_in_executor(None, process.communicate, None, 120)
+                    returncode = process.returncode
+                    stdout_chunks = deque([stdout or b""])
+                    stderr_chunks = deque([stderr or b""])
+                    sentinels = []
                 else:
-                    return subprocess.run(
-                        cmd_list,
-                        capture_output=True,
-                        text=True,
-                        timeout=120,
+                    # 출력은 최근 청크만 보관 (verify 로그가 커도 메모리 사용량 일정)
+                    stdout_chunks = deque()
+                    stderr_chunks = deque()
+                    # 마지막 출력 시각 (drain 스레드에서 갱신)
+                    activity = [time.perf_counter()]
+                    # 보관 범위를 벗어난 stdout에서 건진 마커 줄
+                    sentinels = []
+
+                    # 고정 타임아웃 대신 출력이 멈춘 시간으로 판단
+                    # (정상 진행 중인 긴 verify는 허용, 멈춘 CLI는 빨리 종료)
+                    drains = asyncio.gather(
+                        loop.run_in_executor(None, self._drain, process.stdout, stdout_chunks, activity, sentinels),
+                        loop.run_in_executor(None, self._drain, process.stderr, stderr_chunks, activity),
                     )
+                    try:
+                        await self._wait_with_idle_timeout(drains, activity)
+                    except asyncio.TimeoutError:
+                        tail = b"".join(stdout_chunks)[-2048:].decode("utf-8", errors="replace")
+                        raise HardwareError(
+                            f"Programmer command stalled (no output for {self.cli_idle_timeout}s):\n{tail}"
+                        )
+
+                    returncode = await asyncio.wait_for(
+                        loop.run_in_executor(None, process.wait),
+                        timeout=self.cli_idle_timeout,
+                    )
+            except BaseException:
+                # 타임아웃/취소(teardown, abort) 등으로 대기를 벗어나면 CLI 종료
+                # (ST-LINK 점유 및 executor 스레드가 종료를 막는 것 방지, 빠른 경로 포함)
+                if process.poll() is None:
+                    process.kill()
+                raise
+
+            success = returncode == 0
 
-            result = await loop.run_in_executor(None, run_cmd)
+            if sentinels:
+                # 잘려 나간 앞부분의 마커 줄을 앞에 붙여 파싱 결과 유지
+                stdout_chunks.appendleft(b"\n".join(sentinels) + b"\n")
 
-            # stdout/stderr가 None일 수 있으므로 안전하게 처리
-            stdout = result.stdout or ""
-            stderr = result.stderr or ""
-            output = stdout + stderr
-            success = result.returncode == 0
+            # 스트림별로 bytes 그대로 반환 (마커 검사에 디코딩/연결 불필요)
+            stdout = b"".join(stdout_chunks)
+            stderr = b"".join(stderr_chunks)
 
             if not success:
-                self.emit_log("error", f"Command failed (rc={result.returncode}): {output[:500]}")
+                # CLI 에러 메시지는 출력 끝에 있으므로 스트림별 끝부분만 디코딩
+                # (errors='replace'로 cp949 등 디코딩 에러 방지)
+                self.emit_log(
+                    "error",
+                    f"Command failed (rc={returncode}): "
+                    f"{(stdout[-500:] + stderr[-500:]).decode('utf-8', errors='replace')}",
+                )
 
-            return success, output
-        except subprocess.TimeoutExpired:
+            return success, stdout, stderr
+        except (asyncio.TimeoutError, subprocess.TimeoutExpired):
             raise HardwareError("Programmer command timed out")
+        except HardwareError:
+            raise
         except OSError as e:
             # Windows에서 DLL 로드 실패 등의 상세 에러 캡처
             raise HardwareError(
@@ -411,38 +839,208 @@ class STM32FirmwareUpload(SequenceBase):
             tb = traceback.format_exc()
             raise HardwareError(f"Failed to run programmer: {type(e).__name__}: {e}\n{tb}")
 
+    @staticmethod
+    def _run_subprocess_blocking(
+        cmd_list: list, timeout: float, stream: int, popen_kwargs: Dict[str, Any]
+    ) -> tuple[int, bytes, bytes]:
+        """subprocess.run 1회로 CLI 실행 (executor 스레드에서 실행)
+
+        asyncio 자식 프로세스 감시(child watcher)를 거치지 않고 스레드에서 직접 대기한다.
+
+        Returns:
+            (returncode, stdout, stderr)
+        """
+        import subprocess
+
+        result = subprocess.run(
+            cmd_list,
+            stdout=stream,
+            stderr=stream,
+            timeout=timeout,
+            shell=False,
+            **popen_kwargs,
+        )
+        return result.returncode, result.stdout or b"", result.stderr or b""
+
+    @classmethod
+    def _drain(cls, stream, chunks: deque, activity: list, sentinels: Optional[list] = None) -> None:
+        """파이프를 EOF까지 읽어 마지막 _OUTPUT_TAIL_BYTES만 보관 (executor 스레드에서 실행)
+
+        청크를 받을 때마다 activity[0]에 수신 시각 기록.
+        sentinels가 주어지면 보관 범위를 벗어나 버려지는 출력에서
+        _OUTPUT_RE에 해당하는 줄만 골라 sentinels에 남긴다
+        (verify 로그가 길어도 연결 배너/완료 마커 유실 방지).
+        """
+        size = 0
+        carry = b""
+        with stream:
+            for chunk in iter(lambda: stream.read1(cls._OUTPUT_CHUNK_SIZE), b""):
+                activity[0] = time.perf_counter()
+                chunks.append(chunk)
+                size += len(chunk)
+                while size - len(chunks[0]) >= cls._OUTPUT_TAIL_BYTES:
+                    dropped = chunks.popleft()
+                    size -= len(dropped)
+                    if sentinels is not None:
+                        carry = cls._scan_dropped(carry + dropped, sentinels)
+
+        if sentinels is not None and carry:
+            # 보관 범위 경계에 걸친 줄: 버려진 앞부분(carry)과 남은 첫 줄을 합쳐 검사
+            head = b""
+            for chunk in chunks:
+                end = chunk.find(b"\n")
+                head += chunk if end < 0 else chunk[:end + 1]
+                if end >= 0 or len(head) >= 4096:
+                    break
+            cls._scan_dropped(carry + head[:4096] + b"\n", sentinels)
+
+    @classmethod
+    def _scan_dropped(cls, data: bytes, sentinels: list) -> bytes:
+        """버려지는 출력의 완성된 줄에서 마커 줄을 sentinels에 추가하고 미완성 끝 줄 반환"""
+        end = data.rfind(b"\n") + 1
+        sentinels.extend(m.group(0) for m in cls._OUTPUT_RE.finditer(data, 0, end))
+        # 줄바꿈 없이 매우 긴 출력이 carry에 계속 쌓이지 않도록 제한
+        return data[end:][-4096:]
+
+    async def _wait_with_idle_timeout(self, future: asyncio.Future, activity: list) -> None:
+        """future 완료 대기 - activity[0] 이후 cli_idle_timeout 동안 출력이 없으면 asyncio.TimeoutError"""
+        while True:
+            remaining = self.cli_idle_timeout - (time.perf_counter() - activity[0])
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout=remaining)
+                return
+            except asyncio.TimeoutError:
+                continue  # 대기 중 출력이 있었으면 남은 시간 재계산
+
     async def _check_stlink_connection(self) -> tuple[bool, dict]:
         """ST-LINK 연결 상태 확인"""
-        # 연결 인자를 개별 인자로 분리 (예: "port=SWD mode=HOTPLUG" -> ["port=SWD", "mode=HOTPLUG"])
-        connect_args = self._build_connect_args().split()
-        _, output = await self._run_programmer_cmd(["-c"] + connect_args + ["-l"])
+        # 최근 확인한 ST-LINK가 아직 USB에 연결되어 있으면 CLI 실행 생략
+        if self.stlink_cache_ttl > 0:
+            cached_info = self._lookup_stlink_cache()
+            if cached_info is not None:
+                return True, cached_info
+
+        _, stdout, stderr = await self._run_programmer_cmd(self._probe_argv)
 
         # Device ID가 출력에 있으면 MCU 연결된 것으로 판단
         # (CLI가 -l 옵션에서 exit code 0을 반환하지 않을 수 있음)
-        if "Device ID" in output or "Device name" in output:
-            # 시리얼 번호 추출 시도
-            serial = "unknown"
-            device_name = "unknown"
-            for line in output.split("\n"):
-                if "ST-LINK SN" in line:
-                    parts = line.split(":")
-                    if len(parts) > 1:
-                        serial = parts[1].strip()
-                if "Device name" in line:
-                    parts = line.split(":")
-                    if len(parts) > 1:
-                        device_name = parts[1].strip()
-
-            return True, {"serial": serial, "device_name": device_name}
+        stlink_info = self._parse_stlink_info(self._parse_programmer_output(stdout, stderr))
+        if stlink_info is not None:
+            if self.stlink_cache_ttl > 0 and stlink_info["serial"] != "unknown":
+                self._stlink_cache[stlink_info["serial"].upper()] = (time.perf_counter(), stlink_info)
+            return True, stlink_info
 
         return False, {}
 
+    @staticmethod
+    def _parse_stlink_info(parsed: Dict[str, Any]) -> Optional[dict]:
+        """파싱된 CLI 출력에서 ST-LINK/디바이스 정보 추출 (디바이스 미검출 시 None)"""
+        if parsed["device_id"] is None and parsed["device_name"] is None:
+            return None
+
+        return {
+            "serial": parsed["serial"] or "unknown",
+            "device_name": parsed["device_name"] or "unknown",
+        }
+
+    @classmethod
+    def _parse_programmer_output(cls, *outputs: bytes) -> Dict[str, Any]:
+        """CLI 출력(스트림별)을 정규식 한 번씩 훑어 디바이스 정보와 단계별 완료 마커 추출
+
+        Returns:
+            {"device_id", "serial", "device_name",
+             "erased", "download_complete", "verified", "reset"}
+            (정보가 없으면 None, 마커는 bool)
+        """
+        parsed: Dict[str, Any] = {
+            "device_id": None,
+            "serial": None,
+            "device_name": None,
+            "erased": False,
+            "download_complete": False,
+            "verified": False,
+            "reset": False,
+        }
+        for output in outputs:
+            for m in cls._OUTPUT_RE.finditer(output):
+                key = m.lastgroup
+                # 정보 값(짧은 문자열)만 디코딩
+                parsed[key] = m.group(key).strip().decode("utf-8", errors="replace") if key in cls._INFO_KEYS else True
+        return parsed
+
+    def _lookup_stlink_cache(self) -> Optional[dict]:
+        """캐시된 ST-LINK 정보 조회 (stlink_cache_ttl 이내이고 USB에 아직 연결된 경우)"""
+        if not self._stlink_cache:
+            return None
+
+        now = time.perf_counter()
+        for serial in self._present_stlink_serials():
+            entry = self._stlink_cache.get(serial)
+            if entry is not None and now - entry[0] < self.stlink_cache_ttl:
+                return entry[1]
+        return None
+
+    @staticmethod
+    def _present_stlink_serials() -> set:
+        """USB에 연결된 ST-LINK(VID 0483) 시리얼 목록 (Linux sysfs, 그 외 OS는 빈 set)"""
+        import glob
+
+        serials = set()
+        for vendor_file in glob.glob("/sys/bus/usb/devices/*/idVendor"):
+            device_dir = os.path.dirname(vendor_file)
+            try:
+                with open(vendor_file) as f:
+                    if f.read().strip() != "0483":
+                        continue
+                with open(os.path.join(device_dir, "serial")) as f:
+                    serials.add(f.read().strip().upper())
+            except OSError:
+                continue
+        return serials
+
+    async def _compare_target_firmware(self) -> tuple[bool, dict, bool]:
+        """타겟 플래시를 읽어 펌웨어 파일과 비교
+
+        -u(upload)로 start_address부터 펌웨어 크기만큼 읽어 임시 파일에 저장한 뒤
+        바이트 단위로 비교한다. 연결 배너로 ST-LINK 연결 여부도 함께 판단한다.
+
+        Returns:
+            (connected, stlink_info, identical)
+        """
+        import filecmp
+        import tempfile
+
+        fd, readback_path = tempfile.mkstemp(suffix=".bin")
+        os.close(fd)
+        try:
+            success, stdout, stderr = await self._run_programmer_cmd(
+                ["-c"] + self._connect_args
+                + ["-u", self.start_address, f"0x{self.firmware_size:X}", readback_path]
+            )
+            stlink_info = self._parse_stlink_info(self._parse_programmer_output(stdout, stderr))
+            if stlink_info is None:
+                return False, {}, False
+
+            identical = success and await asyncio.to_thread(
+                filecmp.cmp, readback_path, self.firmware_path, shallow=False
+            )
+            self.emit_log(
+                "info",
+                "Target firmware is identical, skipping flash" if identical
+                else "Target firmware differs, flashing",
+            )
+            return True, stlink_info, identical
+        finally:
+            try:
+                os.remove(readback_path)
+            except OSError:
+                pass
+
     async def _erase_flash(self) -> bool:
         """플래시 메모리 전체 삭제"""
-        connect_args = self._build_connect_args().split()
-        success, _ = await self._run_programmer_cmd(
-            ["-c"] + connect_args + ["-e", "all"]
-        )
+        success, _, _ = await self._run_programmer_cmd(self._erase_argv)
         return success
 
     async def _upload_firmware(self, verify: bool = False) -> tuple[bool, float, bool]:
@@ -454,10 +1052,9 @@ class STM32FirmwareUpload(SequenceBase):
         Returns:
             (upload_success, upload_time, verify_success)
         """
-        start_time = time.time()
+        start_time = time.perf_counter()
 
-        connect_args = self._build_connect_args().split()
-        args = ["-c"] + connect_args + [
+        args = ["-c"] + self._connect_args + [
             "-w", self.firmware_path,
             self.start_address,
         ]
@@ -466,25 +1063,58 @@ class STM32FirmwareUpload(SequenceBase):
         if verify:
             args.append("-v")
 
-        success, output = await self._run_programmer_cmd(args)
-        upload_time = time.time() - start_time
+        success, stdout, stderr = await self._run_programmer_cmd(args)
+        upload_time = time.perf_counter() - start_time
 
         # 검증 결과 확인
         verify_success = False
-        if verify and success:
-            verify_success = "File download complete" in output or "Download verified successfully" in output
-        elif verify:
-            # 업로드는 성공했지만 검증 실패 체크
-            verify_success = "Download verified successfully" in output
+        if verify:
+            parsed = self._parse_programmer_output(stdout, stderr)
+            if success:
+                verify_success = parsed["download_complete"] or parsed["verified"]
+            else:
+                # 업로드는 성공했지만 검증 실패 체크
+                verify_success = parsed["verified"]
 
         return success, upload_time, verify_success if verify else True
 
+    async def _run_full_sequence(self) -> Dict[str, Any]:
+        """업로드/검증/리셋을 단일 CLI 호출로 수행
+
+        CLI는 인자 순서대로 명령을 실행하고 첫 실패에서 중단하므로,
+        한 번의 ST-LINK 연결로 업로드 후 리셋까지 처리할 수 있다.
+        (CLI는 stdin 대화형 모드를 지원하지 않아 프로세스를 유지한 채
+        명령을 보낼 수 없으므로, 연결 비용은 명령 체이닝으로 줄인다)
+        연결 확인/지우기는 스텝별 시간 측정과 중단을 위해 포함하지 않는다.
+
+        Returns:
+            {"success", "duration", "downloaded", "verified", "reset"}
+        """
+        start_time = time.perf_counter()
+
+        args = ["-c"] + self._connect_args + ["-w", self.firmware_path, self.start_address]
+        if self.verify_after_upload:
+            args.append("-v")
+        if self.reset_after_upload:
+            args.append("-rst")
+
+        success, stdout, stderr = await self._run_programmer_cmd(args)
+        duration = time.perf_counter() - start_time
+
+        # 종료 코드가 0이면 전체 성공, 아니면 마커로 실패 단계 판별
+        parsed = self._parse_programmer_output(stdout, stderr)
+        downloaded = success or parsed["download_complete"]
+        return {
+            "success": success,
+            "duration": duration,
+            "downloaded": downloaded,
+            "verified": parsed["verified"] or (success and downloaded),
+            "reset": success or parsed["reset"],
+        }
+
     async def _reset_target(self) -> bool:
         """타겟 리셋"""
-        connect_args = self._build_connect_args().split()
-        success, _ = await self._run_programmer_cmd(
-            ["-c"] + connect_args + ["-rst"]
-        )
+        success, _, _ = await self._run_programmer_cmd(self._reset_argv)
         return success
 
 
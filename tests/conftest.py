@@ -3,6 +3,7 @@ Pytest configuration and fixtures for SDK v2 compatibility testing.
 """
 import pytest
 import asyncio
+import dataclasses
 import sys
 from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock, patch
@@ -11,29 +12,41 @@ from typing import Dict, Any
 # Add sequences to path
 sys.path.insert(0, str(Path(__file__).parent.parent / "sequences" / "stm32_firmware_upload"))
 
-from station_service_sdk import ExecutionContext
+from station_service_sdk import ExecutionContext, SequenceLoader, SequenceSimulator
+from sequence import STM32FirmwareUpload
 
+@pytest.fixture(scope="session")
+def sequence_loader():
+    """Shared SequenceLoader for the sequences directory (caches loaded manifests)."""
+    return SequenceLoader(str(Path(__file__).parent.parent / "sequences"))
 
-@pytest.fixture
-def temp_firmware_file(tmp_path):
-    """Create a temporary firmware file for testing."""
-    firmware_file = tmp_path / "test_firmware.bin"
+
+@pytest.fixture(scope="session")
+def sequence_simulator(sequence_loader):
+    """Shared SequenceSimulator backed by the session loader."""
+    return SequenceSimulator(sequence_loader)
+
+
+@pytest.fixture(scope="session")
+def temp_firmware_file(tmp_path_factory):
+    """Create a temporary firmware file shared by all tests (read-only)."""
+    firmware_file = tmp_path_factory.mktemp("firmware") / "test_firmware.bin"
     # Create a minimal valid binary file
     firmware_file.write_bytes(b'\x00' * 1024)
     return firmware_file
 
 
-@pytest.fixture
-def mock_programmer_path(tmp_path):
-    """Create a mock STM32CubeProgrammer CLI."""
+@pytest.fixture(scope="session")
+def mock_programmer_path(tmp_path_factory):
+    """Create a mock STM32CubeProgrammer CLI shared by all tests (read-only)."""
     import os
-    programmer = tmp_path / "STM32_Programmer_CLI"
+    programmer = tmp_path_factory.mktemp("programmer") / "STM32_Programmer_CLI"
     programmer.write_text("#!/bin/bash\necho 'STM32CubeProgrammer version 2.17.0'\n")
     os.chmod(programmer, 0o755)
     return programmer
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def execution_context_factory():
     """Factory for creating ExecutionContext instances."""
     def _create(
@@ -47,13 +60,63 @@ def execution_context_factory():
             wip_id=wip_id,
             sequence_name="stm32_firmware_upload",
             sequence_version="1.0.0",
-            hardware_config={},
+            hardware_config={},  # the sequence has no hardware drivers
             parameters=parameters or {},
             dry_run=dry_run
         )
     return _create
 
 
+def _readonly_context(factory, firmware, programmer, dry_run: bool) -> ExecutionContext:
+    return factory(
+        parameters={"firmware_path": str(firmware), "programmer_path": str(programmer)},
+        dry_run=dry_run,
+    )
+
+
+@pytest.fixture(scope="session")
+def readonly_context(execution_context_factory, temp_firmware_file, mock_programmer_path):
+    """Shared ExecutionContext for tests that never mutate the context or its parameters."""
+    return _readonly_context(execution_context_factory, temp_firmware_file, mock_programmer_path, False)
+
+
+@pytest.fixture(scope="session")
+def dry_run_context(execution_context_factory, temp_firmware_file, mock_programmer_path):
+    """Shared dry-run ExecutionContext for read-only tests."""
+    return _readonly_context(execution_context_factory, temp_firmware_file, mock_programmer_path, True)
+
+
+@pytest.fixture
+def seq_factory(execution_context_factory):
+    """Factory for STM32FirmwareUpload instances sharing one parameter dict with their context.
+
+    Pass context= to build on an existing (e.g. session-shared) context instead;
+    the instance then gets its own copy of the context's hardware config and parameters.
+    """
+    def _create(
+        firmware=None,
+        programmer=None,
+        dry_run: bool = False,
+        context: ExecutionContext = None,
+        **extra: Any
+    ) -> STM32FirmwareUpload:
+        if context is not None:
+            context = dataclasses.replace(
+                context,
+                hardware_config=dict(context.hardware_config),
+                parameters=dict(context.parameters),
+            )
+            return STM32FirmwareUpload(context=context)
+        parameters = {
+            "firmware_path": str(firmware),
+            "programmer_path": str(programmer),
+            **extra,
+        }
+        context = execution_context_factory(parameters=parameters, dry_run=dry_run)
+        return STM32FirmwareUpload(context=context, parameters=parameters)
+    return _create
+
+
 @pytest.fixture
 def mock_subprocess():
     """Mock asyncio.create_subprocess_exec for CLI testing."""